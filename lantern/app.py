@@ -13,45 +13,91 @@ Includes:
 Responses are returned as JSON, and errors are handled with appropriate HTTP status codes.
 """
 
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from .models import SimulationParams
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from .constants import SIMULATION_CACHE_SIZE
+from .models import SimulationParams, SimulationResult
 from .main import run_simulation
-from pydantic import BaseModel
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs one small simulation before serving requests, such that the first real request
+    does not pay for one-time costs like jit-compiling the battery kernel.
+    """
+    await asyncio.get_running_loop().run_in_executor(
+        None, lambda: run_simulation(5, "sum", 100, 0, True)
+    )
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# run_simulation reseeds the global RNGs and accumulates into the static
+# MarketSolution.overall_trading_network, so simulations must not interleave.
+_simulation_lock = threading.Lock()
+
+# serializes straight to utf-8 bytes, so cached responses need no re-encoding
+_result_adapter: TypeAdapter[SimulationResult] = TypeAdapter(SimulationResult)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  # React dev server URL
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["POST"],  # only /api/simulate is exposed
+    allow_headers=["Content-Type"],
 )
 
-class SimulationParams(BaseModel):
-    community_size: int
-    season: str
-    pv_percentage: int
-    sd_percentage: int
-    with_battery: bool
-
-@app.post("/api/simulate")
-async def simulate(params: SimulationParams):
-    print(f"Simulation request received with parameters: {params}")
-    
-    try:
+@lru_cache(maxsize=SIMULATION_CACHE_SIZE)
+def _run_simulation_json(
+    community_size: int,
+    season: str,
+    pv_percentage: int,
+    sd_percentage: int,
+    with_battery: bool,
+) -> bytes:
+    """
+    Runs the simulation and returns the serialized result. The simulation is deterministic
+    in its parameters, so repeated requests are answered from the cache.
+    """
+    with _simulation_lock:
         result = run_simulation(
-            community_size=params.community_size,
-            season=params.season,
-            pv_percentage=params.pv_percentage,
-            sd_percentage=params.sd_percentage,
-            with_battery=params.with_battery,
+            community_size=community_size,
+            season=season,
+            pv_percentage=pv_percentage,
+            sd_percentage=sd_percentage,
+            with_battery=with_battery,
         )
+    # serialize with pydantic's rust serializer, bypassing jsonable_encoder
+    return _result_adapter.dump_json(result)
+
 
-        return JSONResponse(content=result.model_dump())
+@app.post("/api/simulate", response_class=Response)
+def simulate(params: SimulationParams):
+    # sync handler: starlette runs it in its threadpool, keeping the event loop free
+    logger.debug("Simulation request received with parameters: %s", params)
+
+    try:
+        content: bytes = _run_simulation_json(
+            params.community_size,
+            params.season,
+            params.pv_percentage,
+            params.sd_percentage,
+            params.with_battery,
+        )
+        return Response(content=content, media_type="application/json")
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Simulation failed: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
@@ -7,24 +7,115 @@ This module models a battery for the LEC simulation. Provides API for charging a
 Considers c_rate, conversion loss, and other factors to make it more realistic.
 """
 
-from functools import cached_property
+import numpy as np
 from .constants import (
+    CHARGE_EFFICIENCY,
     CHARGE_THRESHOLD,
-    CONVERSION_LOSS,
+    INV_CHARGE_EFFICIENCY,
     RETENTION_RATE,
     C_RATE,
     DISCHARGE_THRESHOLD,
 )
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, without it the kernels below run as plain python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def _run_schedule(
+    supply: np.ndarray,
+    demand: np.ndarray,
+    cap: float,
+    min_charge: float,
+    max_charge: float,
+    c_rate_limit: float,
+    retention_factor: float,
+) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    Kernel of `Battery.simulate_schedule`. The loop is sequential in the battery state `cap`,
+    so it only takes flat float arrays and scalars to be compilable by numba.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, float]: The charged and discharged amounts per timestep,
+            and the battery state after the last timestep.
+    """
+    charged = np.zeros(len(supply))
+    discharged = np.zeros(len(demand))
+    for t in range(len(supply)):
+        if supply[t] > 0:
+            amount = min(supply[t], min(max(0.0, max_charge - cap), c_rate_limit) * INV_CHARGE_EFFICIENCY)
+            cap += amount * CHARGE_EFFICIENCY
+            charged[t] = amount
+        elif demand[t] > 0:
+            amount = min(demand[t], min(max(0.0, cap - min_charge), c_rate_limit) * CHARGE_EFFICIENCY)
+            cap -= amount * INV_CHARGE_EFFICIENCY
+            discharged[t] = amount
+        else:
+            continue
+        cap *= retention_factor
+    return charged, discharged, cap
+
+
+@njit(cache=True)
+def _run_bank_schedule(
+    supply: np.ndarray,
+    demand: np.ndarray,
+    cap: np.ndarray,
+    min_charge: float,
+    max_charge: float,
+    c_rate_limit: float,
+    retention_factor: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Kernel of `BatteryBank.simulate_schedule`. The batteries are independent of each other,
+    so every column is run through `_run_schedule` on its own. Updates `cap` in place.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (timesteps, batteries) arrays of the charged and
+            discharged amounts.
+    """
+    charged = np.zeros(supply.shape)
+    discharged = np.zeros(demand.shape)
+    for i in range(supply.shape[1]):
+        column_charged, column_discharged, cap[i] = _run_schedule(
+            supply[:, i], demand[:, i], cap[i], min_charge, max_charge, c_rate_limit, retention_factor
+        )
+        charged[:, i] = column_charged
+        discharged[:, i] = column_discharged
+    return charged, discharged
+
 
 class Battery:
+    __slots__ = (
+        "_capacity",
+        "_current_cap",
+        "_timestep_duration",
+        "_min_charge",
+        "_max_charge",
+        "_c_rate_limit",
+        "_retention_factor",
+    )
+
     def __init__(self, capacity: float, timestep_duration: float):
         assert capacity >= 0, "Battery Capacity not allowed to be negative."
 
         self._capacity: float = capacity
-        self._current_cap: float = DISCHARGE_THRESHOLD * capacity
         self._timestep_duration: float = timestep_duration
 
+        # loop invariants of the (dis)charging bookkeeping
+        self._min_charge: float = DISCHARGE_THRESHOLD * capacity
+        self._max_charge: float = CHARGE_THRESHOLD * capacity
+        self._c_rate_limit: float = C_RATE * timestep_duration * capacity
+        self._retention_factor: float = 1 - ((1 - RETENTION_RATE) * timestep_duration)
+
+        self._current_cap: float = self._min_charge
+
     def charge(self, amount: float) -> float:
         """
         Tries to charge the battery with the given amount. The method considers
@@ -40,9 +131,14 @@ class Battery:
                 This value will be less than or equal to the input `amount`, but greater than the capacity
                 the battery gained.
         """
-        amount = min(amount, self._maxChargeAmount())
-        charged_amount: float = amount * 1 - CONVERSION_LOSS
-        self._current_cap += charged_amount
+        current_cap: float = self._current_cap
+        # don't charge beyond charging threshold, nor faster than C_RATE
+        headroom: float = self._max_charge - current_cap
+        allowed: float = headroom if headroom < self._c_rate_limit else self._c_rate_limit
+        # some energy is lost when converting
+        max_amount: float = max(0.0, allowed) * INV_CHARGE_EFFICIENCY
+        amount = amount if amount < max_amount else max_amount
+        self._current_cap = current_cap + amount * CHARGE_EFFICIENCY
         self._timestep()
         return amount
 
@@ -61,50 +157,109 @@ class Battery:
             float: The amount of power available for the client after discharging (after considering conversion loss).
                 This value will be less than or equal to the input `amount`, and to the lost capacity of the battery.
         """
-        amount = min(amount, self._maxDischargeAmount())
-        discharged_amount: float = amount * 1 / (1 - CONVERSION_LOSS)
-        self._current_cap -= discharged_amount
+        current_cap: float = self._current_cap
+        # only discharge to threshold, and no faster than C_RATE
+        headroom: float = current_cap - self._min_charge
+        allowed: float = headroom if headroom < self._c_rate_limit else self._c_rate_limit
+        # some energy is lost when converting
+        max_amount: float = max(0.0, allowed) * CHARGE_EFFICIENCY
+        amount = amount if amount < max_amount else max_amount
+        self._current_cap = current_cap - amount * INV_CHARGE_EFFICIENCY
         self._timestep()
         return amount
 
+    def simulate_schedule(
+        self, supply: np.ndarray, demand: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Runs the battery over a whole horizon in one pass. In every timestep, the battery is
+        charged with the supply if there is any, and otherwise discharged to cover the demand.
+        Timesteps without supply or demand leave the battery untouched, exactly as if
+        `charge` and `discharge` were called per timestep.
+
+        Args:
+            supply (np.ndarray): The surplus per timestep offered to the battery, in kWh.
+            demand (np.ndarray): The deficit per timestep requested from the battery, in kWh.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The amounts per timestep as returned by `charge` and
+                `discharge` respectively.
+        """
+        charged: np.ndarray
+        discharged: np.ndarray
+        charged, discharged, self._current_cap = _run_schedule(
+            np.asarray(supply, dtype=np.float64),
+            np.asarray(demand, dtype=np.float64),
+            self._current_cap,
+            self._min_charge,
+            self._max_charge,
+            self._c_rate_limit,
+            self._retention_factor,
+        )
+        return charged, discharged
+
     def reset(self) -> None:
         """
         Resets the battery to its minimum allowed capacity.
         """
-        self._current_cap = DISCHARGE_THRESHOLD * self._capacity
+        self._current_cap = self._min_charge
 
-    def _maxChargeAmount(self) -> float:
-        # some energy is lost when converting
-        # don't charge faster than C_RATE
-        # don't charge beyond charging threshold
-        maxChargeAmount: float = max(0.0, self._maxAllowedCharge - self._current_cap)
-        cRateLimit: float = self._getCRateLimit()
-        maxChargeAmount = min(maxChargeAmount, cRateLimit)
-        return maxChargeAmount * (1 / (1 - CONVERSION_LOSS))
-
-    def _maxDischargeAmount(self) -> float:
-        # some energy is lost when converting
-        # only discharge to threshold
-        # discharge at rate no faster than given by c_rate
-        maxDischargeAmount: float = max(0.0, self._current_cap - self._minAllowedCharge)
-        cRateLimit: float = C_RATE * self._timestep_duration * self._capacity
-        maxDischargeAmount = min(maxDischargeAmount, cRateLimit)
-        return maxDischargeAmount * (1 - CONVERSION_LOSS)
+    def _timestep(self) -> None:
+        """
+        Executes bookkeeping operations that signify a timestep was executed.
+        """
+        # charge/discharge are bounded by the thresholds, so no clamping is needed
+        assert 0 <= self._current_cap <= self._capacity
+        self._current_cap *= self._retention_factor
 
-    def _getCRateLimit(self) -> float:
-        return C_RATE * self._timestep_duration * self._capacity
 
-    @cached_property
-    def _minAllowedCharge(self) -> float:
-        return DISCHARGE_THRESHOLD * self._capacity
+class BatteryBank:
+    """
+    Models a bank of independent batteries of equal size as a structure of arrays, such
+    that a whole schedule of all batteries runs in a single kernel call.
+    The (dis)charging semantics are the same as for `Battery`.
+    """
 
-    @cached_property
-    def _maxAllowedCharge(self) -> float:
-        return CHARGE_THRESHOLD * self._capacity
+    __slots__ = (
+        "_current_cap",
+        "_min_charge",
+        "_max_charge",
+        "_c_rate_limit",
+        "_retention_factor",
+    )
 
-    def _timestep(self) -> None:
+    def __init__(self, num_batteries: int, capacity: float, timestep_duration: float):
+        assert capacity >= 0, "Battery Capacity not allowed to be negative."
+
+        self._min_charge: float = DISCHARGE_THRESHOLD * capacity
+        self._max_charge: float = CHARGE_THRESHOLD * capacity
+        self._c_rate_limit: float = C_RATE * timestep_duration * capacity
+        self._retention_factor: float = 1 - ((1 - RETENTION_RATE) * timestep_duration)
+
+        self._current_cap: np.ndarray = np.full(num_batteries, self._min_charge)
+
+    def simulate_schedule(
+        self, supply: np.ndarray, demand: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
         """
-        Executes bookkeeping operations that signify a timestep was executed.
+        Runs all batteries over a whole horizon. In every timestep, battery i is charged with
+        supply[t][i] if it is positive, and otherwise discharged to cover demand[t][i]. This is
+        equivalent to running one `Battery` per column through `Battery.simulate_schedule`.
+
+        Args:
+            supply (np.ndarray): (timesteps, batteries) array of surplus offered for charging.
+            demand (np.ndarray): (timesteps, batteries) array of deficit requested from discharging.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (timesteps, batteries) arrays of the charged and
+                discharged amounts.
         """
-        self._current_cap = min(self._capacity, max(0, self._current_cap))
-        self._current_cap *= 1 - ((1 - RETENTION_RATE) * self._timestep_duration)
+        return _run_bank_schedule(
+            np.asarray(supply, dtype=np.float64),
+            np.asarray(demand, dtype=np.float64),
+            self._current_cap,
+            self._min_charge,
+            self._max_charge,
+            self._c_rate_limit,
+            self._retention_factor,
+        )
@@ -7,7 +7,6 @@ Holds constants used in the entire project, which are "meta-parameters" for the
 """
 
 from typing import TypeAlias
-import seaborn as sns
 
 NetworkAlloc: TypeAlias = dict[str, dict[str, float]]
 
@@ -28,6 +27,9 @@ P2P_PRICE: float = GRID_BUY_PRICE + GRID_SELL_PRICE / 2.0
 RETENTION_RATE: float = 0.999
 # conversion loss for every battery transaction
 CONVERSION_LOSS: float = 0.05
+# fraction of energy that remains after a battery conversion, and its reciprocal
+CHARGE_EFFICIENCY: float = 1 - CONVERSION_LOSS
+INV_CHARGE_EFFICIENCY: float = 1 / CHARGE_EFFICIENCY
 # (dis)charging rate - must take at least 1/C_RATE hours to (dis)charge battery
 C_RATE: float = 0.5
 # minimum allowed charging level
@@ -53,6 +55,9 @@ DECIMAL_POINTS: int = 2
 # number of bins for bar charts
 N_BINS: int = 100
 
+# number of serialized simulation results kept by the web app
+SIMULATION_CACHE_SIZE: int = 512
+
 # seaborn color palette used for plots
 COLOR_PALETTE: str = "deep"
 
@@ -66,4 +71,7 @@ PKL_PV_FILE: str = "pv.pkl"
 class Constants:
     @staticmethod
     def getColorPalette(numColors: int):
+        # seaborn pulls in matplotlib and scipy.stats, only import it when plotting
+        import seaborn as sns
+
         return sns.color_palette(COLOR_PALETTE, numColors)
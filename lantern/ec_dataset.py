@@ -8,7 +8,7 @@ datasets for energy communities.
 """
 
 from .models import SimulationResult, MarketMetrics, EnergyMetrics, IndividualMetrics, CostMetrics, TradingNetwork, Profiles
-from .battery import Battery
+from .battery import BatteryBank
 from .constants import BATTERY_SIZE, P2P_PRICE, GRID_BUY_PRICE, GRID_SELL_PRICE, NetworkAlloc, APT_BLOCK_SIZE, RANDOM_SEED
 from .market_solution import MarketSolution
 from scipy.signal import find_peaks
@@ -20,9 +20,17 @@ from typing import List, Optional, Self
 
 
 def get_daily_profile(data: pd.DataFrame) -> List[float]:
-    data.index = pd.to_datetime(data.index)
+    # the index already holds the localized timestamps, no need to convert (and mutate) it
     return data.groupby(data.index.hour).mean().mean(axis=1).tolist()
 
+def _nlargest(values: np.ndarray, n: int) -> np.ndarray:
+    # positions of the n largest values, ties resolved like pd.Series.nlargest (first occurrence wins)
+    return np.argsort(-values, kind="stable")[:n]
+
+def _nsmallest(values: np.ndarray, n: int) -> np.ndarray:
+    # positions of the n smallest values, ties resolved like pd.Series.nsmallest (first occurrence wins)
+    return np.argsort(values, kind="stable")[:n]
+
 def adjust_for_smart_devices(smart_device_percentage: int, load: pd.DataFrame, pv: pd.DataFrame) -> pd.DataFrame:
     """
     Attempts to reduce peak loads by shifting loads for a subset of users while increasing PV consumption,
@@ -31,109 +39,87 @@ def adjust_for_smart_devices(smart_device_percentage: int, load: pd.DataFrame, p
     if smart_device_percentage == 0:
         return load
 
-    load_shifted = load.copy()
-    users = load_shifted.columns
+    users = load.columns
     shiftable_users = np.random.choice(
         users, size=int(len(users) * smart_device_percentage / 100), replace=False
     )
+    shiftable_cols: np.ndarray = users.get_indexer(shiftable_users)
 
     shift_daily = 0.64  # kWh
     shift_3day = 0.5  # kWh
 
-    # convert timestamps to date for grouping
-    load_shifted["date"] = load_shifted.index.date
-    pv_copy = pv.copy()
-    pv_copy["date"] = pv_copy.index.date
-    grouped_load = load_shifted.groupby("date")
-    grouped_generation = pv_copy.groupby("date")
+    # work on raw arrays in the input's dtype, loads are shifted by row/column position
+    load_shifted: np.ndarray = load.to_numpy(copy=True)
+    # the totals are summed by pandas, as find_peaks' prominence threshold and the top-k
+    # selection are sensitive to the rounding of the sum. Shifts stay within a day and
+    # happen after its totals are read, so they can be computed up front
+    total_demand: np.ndarray = load.sum(axis=1).to_numpy()
+    total_generation: np.ndarray = pv.sum(axis=1).to_numpy()
+
+    # group the rows by day once via integer day codes, keeping the rows of a day in order
+    day_codes, days = pd.factorize(load.index.normalize(), sort=True)
+    rows_by_day: list[np.ndarray] = np.split(
+        np.argsort(day_codes, kind="stable"), np.cumsum(np.bincount(day_codes))[:-1]
+    )
+    in_allowed_range: np.ndarray = np.zeros(len(load), dtype=bool)
+    in_allowed_range[load.index.indexer_between_time("08:00", "22:00")] = True
 
-    for day, data in grouped_load:
+    for day, rows in zip(days, rows_by_day):
 
         # find peak hours of each day in allowed time range
         N_peaks = 3
-        total_demand = data.drop(columns=["date"], errors="ignore").sum(axis=1)
+        valid_rows = rows[in_allowed_range[rows]]
+        valid_demand = total_demand[valid_rows]
 
-        valid_hours = total_demand.between_time("08:00", "22:00")
+        peak_indices, _ = find_peaks(valid_demand, prominence=0.2, distance=N_peaks)
+        if len(peak_indices) == 0:
+            peak_indices = np.arange(len(valid_demand))
+        peak_rows = valid_rows[peak_indices[_nlargest(valid_demand[peak_indices], 3)]]
 
-        peak_indices, _ = find_peaks(valid_hours, prominence=0.2, distance=N_peaks)
-        peak_hours = (
-            valid_hours.iloc[peak_indices].nlargest(3).index
-            if len(peak_indices) > 0
-            else valid_hours.nlargest(3).index
-        )
-
-        valley_hours = valid_hours.nsmallest(N_peaks).index
+        valley_rows = valid_rows[_nsmallest(valid_demand, N_peaks)]
 
-        # Get PV generation for the same day
-        pv_data = grouped_generation.get_group(day).drop(
-            columns=["date"], errors="ignore"
-        )
-        pv_generation = pv_data.sum(axis=1)
         # all 3 highest pv hours are probably from same "pv peak"
-        high_pv_hours = pv_generation.nlargest(
-            3
-        ).index  # assuming these are in the valid range of hours.
-
-        # shift daily load (dishwasher)
-        if len(peak_hours) > 0:
-            peak_hour = peak_hours[0]  # take the highest peak
-            for user in shiftable_users:
-                if (
-                    load_shifted.loc[peak_hour, user] >= shift_daily
-                ):  # user has enough load to shift
-                    # try to shift to high PV generation hours
-                    shift_target = (
-                        np.random.choice(high_pv_hours)
-                        if not high_pv_hours.empty
-                        else np.random.choice(valley_hours)
-                    )
-                    # shift the load
-                    load_shifted.loc[peak_hour, user] -= shift_daily
-                    load_shifted.loc[shift_target, user] += shift_daily
+        high_pv_rows = rows[
+            _nlargest(total_generation[rows], 3)
+        ]  # assuming these are in the valid range of hours.
+        shift_targets = high_pv_rows if len(high_pv_rows) > 0 else valley_rows
+
+        if len(peak_rows) == 0:
+            continue
+
+        # shift daily load (dishwasher) of users with enough load at the highest peak,
+        # each to one of the high PV generation hours at random
+        peak_row = peak_rows[0]
+        movers = shiftable_cols[load_shifted[peak_row, shiftable_cols] >= shift_daily]
+        targets = shift_targets[np.random.randint(0, len(shift_targets), size=len(movers))]
+        load_shifted[peak_row, movers] -= shift_daily
+        # every user appears once, so no (row, column) pair repeats
+        load_shifted[targets, movers] += shift_daily
 
         # shift every 3 days (washing machine)
-        if day.day % 3 == 0 and len(peak_hours) > 0:
-            peak_hour = (
-                peak_hours[1] if len(peak_hours) > 1 else peak_hours[0]
+        if day.day % 3 == 0:
+            peak_row = (
+                peak_rows[1] if len(peak_rows) > 1 else peak_rows[0]
             )  # try to use 2nd highest peak
-            for user in shiftable_users:
-                if load_shifted.loc[peak_hour, user] >= shift_3day:
-                    shift_target = (
-                        np.random.choice(high_pv_hours)
-                        if not high_pv_hours.empty
-                        else np.random.choice(valley_hours)
-                    )
-                    load_shifted.loc[peak_hour, user] -= shift_3day
-                    load_shifted.loc[shift_target, user] += shift_3day
-
-    return load_shifted.drop(columns="date")
+            movers = shiftable_cols[load_shifted[peak_row, shiftable_cols] >= shift_3day]
+            targets = shift_targets[np.random.randint(0, len(shift_targets), size=len(movers))]
+            load_shifted[peak_row, movers] -= shift_3day
+            load_shifted[targets, movers] += shift_3day
+
+    return pd.DataFrame(load_shifted, index=load.index, columns=load.columns)
 
 def adjust_for_batteries(supply: pd.DataFrame, demand: pd.DataFrame, timestepDuration: float) -> tuple[np.ndarray, np.ndarray]:
     # assume everyone has pv (and battery), since ones without pv just have 0 in pv_data
-    numTimesteps: int; numParticipants: int
-    numTimesteps, numParticipants = supply.shape
-    batteries = np.array(
-        [
-            Battery(BATTERY_SIZE, timestepDuration)
-            for _ in range(numParticipants)
-        ]
+    batteries = BatteryBank(supply.shape[1], BATTERY_SIZE, timestepDuration)
+    charged: np.ndarray
+    discharged: np.ndarray
+    charged, discharged = batteries.simulate_schedule(
+        supply.to_numpy(dtype=np.float64), demand.to_numpy(dtype=np.float64)
     )
-    charge_volume_per_member = np.zeros(numParticipants)
-    discharge_volume_per_member = np.zeros(numParticipants)
-    for t in range(numTimesteps):
-        for i in range(numParticipants):
-            if supply.iloc[t, i] > 0:
-                chargeAmount: float = batteries[i].charge(supply.iloc[t, i])
-                charge_volume_per_member[i] += chargeAmount
-                supply.iloc[t, i] -= chargeAmount
-            elif demand.iloc[t, i] > 0:
-                dischargeAmount: float = batteries[i].discharge(
-                    demand.iloc[t, i]
-                )
-                discharge_volume_per_member[i] += dischargeAmount
-                demand.iloc[t, i] -= dischargeAmount
-
-    return charge_volume_per_member, discharge_volume_per_member
+    supply -= charged
+    demand -= discharged
+
+    return charged.sum(axis=0), discharged.sum(axis=0)
 
 def getTradingNetwork(gridPurchaseVol: float, gridFeedInVol: float) -> nx.DiGraph:
     network: NetworkAlloc = MarketSolution.overall_trading_network
@@ -141,43 +127,35 @@ def getTradingNetwork(gridPurchaseVol: float, gridFeedInVol: float) -> nx.DiGrap
     G: nx.DiGraph = nx.DiGraph()
 
     # Add edges to the graph from the dictionary
-    for u, neighbors in network.items():
-        for v, weight in neighbors.items():
-            G.add_edge(u, v, weight=weight)
+    G.add_weighted_edges_from(
+        (u, v, weight) for u, neighbors in network.items() for v, weight in neighbors.items()
+    )
 
     return G
 
 def aggregate_into_buildings(load: pd.DataFrame) -> pd.DataFrame:
-    load = load.T
-    if len(load) % APT_BLOCK_SIZE != 0:
-        print(len(load))
-        raise ValueError(f"The number of rows must be divisible by {APT_BLOCK_SIZE} for aggregation.")
-
-    shuffled_load = load.sample(frac=1, random_state=RANDOM_SEED).reset_index(drop=True)
-
-    num_buildings = len(shuffled_load) // 6
-    shuffled_load['Building_ID'] = np.repeat(np.arange(num_buildings), APT_BLOCK_SIZE)
-    return pd.DataFrame(shuffled_load.groupby('Building_ID').sum()).T
+    num_households: int = load.shape[1]
+    if num_households % APT_BLOCK_SIZE != 0:
+        raise ValueError(
+            f"The number of rows must be divisible by {APT_BLOCK_SIZE} for aggregation, got {num_households}.")
+
+    # shuffle the households (same permutation as DataFrame.sample(frac=1)) and sum each
+    # consecutive block of APT_BLOCK_SIZE households into one building
+    order: np.ndarray = np.random.RandomState(RANDOM_SEED).permutation(num_households)
+    num_buildings: int = num_households // APT_BLOCK_SIZE
+    values: np.ndarray = load.to_numpy()[:, order].reshape(len(load), num_buildings, APT_BLOCK_SIZE)
+    return pd.DataFrame(values.sum(axis=2), index=load.index)
 
 def average_per_month(consumption: pd.DataFrame, production: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-    consumption = consumption.T; production = production.T
-    pv_data_monthly = pd.DataFrame()
-    load_data_monthly = pd.DataFrame()
-    months = sorted(set(col.month for col in production.columns))
-    for month in months:
-        pv_month_cols = [col for col in production.columns if col.month == month]
-        load_month_cols = [col for col in consumption.columns if col.month == month]
-        # Group by hour of day and average
-        for hour in range(24):
-            # Get columns for this hour in this month
-            pv_hour_cols = [col for col in pv_month_cols if col.hour == hour]
-            load_hour_cols = [col for col in load_month_cols if col.hour == hour]
-
-            if pv_hour_cols and load_hour_cols:
-                timestamp = pd.Timestamp(2024, month, 15, hour)
-                pv_data_monthly[timestamp] = production[pv_hour_cols].mean(axis=1)
-                load_data_monthly[timestamp] = consumption[load_hour_cols].mean(axis=1)
-    return load_data_monthly.T, pv_data_monthly.T
+    def monthly_profile(data: pd.DataFrame) -> pd.DataFrame:
+        # group by month and hour of day and average, in one grouped reduction
+        averaged: pd.DataFrame = data.groupby([data.index.month, data.index.hour]).mean()
+        averaged.index = pd.DatetimeIndex(
+            [pd.Timestamp(2024, month, 15, hour) for month, hour in averaged.index]
+        )
+        return averaged
+
+    return monthly_profile(consumption), monthly_profile(production)
 
 class ECDataset:
     def __init__(
@@ -216,6 +194,26 @@ class ECDataset:
         # solutions to the flow problem per time interval
         self.marketSolutions: List[MarketSolution] = []
 
+        # float64 copies of supply/demand for the market and the cost computation
+        self._supply_np: npt.NDArray[np.float64]
+        self._demand_np: npt.NDArray[np.float64]
+
+        # market results as flat arrays, _purchased[t][j] is the amount member j bought in interval t
+        # and _trading_volumes[t] is the volume traded in interval t
+        self._purchased: npt.NDArray[np.float64]
+        self._sold: npt.NDArray[np.float64]
+        self._trading_volumes: npt.NDArray[np.float64]
+        self._supply_volumes: npt.NDArray[np.float64]
+
+        # overall volumes of the core DataFrames, computed once the simulation is done
+        self._production_volume: np.float64
+        self._consumption_volume: np.float64
+        self._supply_volume: np.float64
+        self._demand_volume: np.float64
+        self._production_per_member: npt.NDArray[np.float64]
+        self._consumption_per_member: npt.NDArray[np.float64]
+        self._self_consumption_per_member: npt.NDArray[np.float64]
+
         self._total_charge_volume: float = 0.0
         self._total_discharge_volume: float = 0.0
         self._charge_volume_per_member: np.ndarray
@@ -262,8 +260,10 @@ class ECDataset:
         load, pv = average_per_month(load, pv)
 
         self.numTimesteps, self.numParticipants = load.shape
-        supply: pd.DataFrame = (pv - load).clip(lower=0)
-        demand: pd.DataFrame = (load - pv).clip(lower=0)
+        # supply and demand are the positive and negative parts of the same difference
+        surplus: np.ndarray = pv.to_numpy() - load.to_numpy()
+        supply: pd.DataFrame = pd.DataFrame(np.maximum(surplus, 0), index=load.index, columns=load.columns)
+        demand: pd.DataFrame = pd.DataFrame(np.maximum(-surplus, 0), index=load.index, columns=load.columns)
 
         charge_volume_per_member: np.ndarray = np.zeros(self.numParticipants)
         discharge_volume_per_member: np.ndarray = np.zeros(self.numParticipants)
@@ -271,11 +271,20 @@ class ECDataset:
         if self._with_battery:
             charge_volume_per_member, discharge_volume_per_member = adjust_for_batteries(supply, demand, self.timestepDuration)
 
-        # compute the market
+        # compute the market on the raw rows, avoiding a Series per timestep
+        self._supply_np = supply.to_numpy(dtype=np.float64)
+        self._demand_np = demand.to_numpy(dtype=np.float64)
+        self._purchased = np.empty((self.numTimesteps, self.numParticipants))
+        self._sold = np.empty((self.numTimesteps, self.numParticipants))
+        self._trading_volumes = np.empty(self.numTimesteps)
+        self._supply_volumes = np.empty(self.numTimesteps)
         for t in range(self.numTimesteps):
-            self.marketSolutions.append(
-                MarketSolution(supply.iloc[t], demand.iloc[t])
-            )
+            solution: MarketSolution = MarketSolution(self._supply_np[t], self._demand_np[t])
+            self._purchased[t] = solution.purchasedPerMember
+            self._sold[t] = solution.soldPerMember
+            self._trading_volumes[t] = solution.tradingVolume
+            self._supply_volumes[t] = solution.supplyVolume
+            self.marketSolutions.append(solution)
 
         # assign all fields for evaluation
         self.consumption = load
@@ -286,6 +295,7 @@ class ECDataset:
         self._discharge_volume_per_member = discharge_volume_per_member
         self._total_charge_volume = sum(charge_volume_per_member)
         self._total_discharge_volume = sum(discharge_volume_per_member)
+        self._compute_volumes()
 
 
         # compute the number of days which are actually computed (due to averaging its less than
@@ -293,7 +303,6 @@ class ECDataset:
         numDaysComputed: float = self.numTimesteps * self.timestepDuration / 24
 
         G = getTradingNetwork(self.getGridPurchaseVolume(), self.getGridFeedInVolume())
-        print(f"demand {self.getDemandVolume()} vs supply {self.getSupplyVolume()} vs trading volume {self.getTradingVolume()}")
         return SimulationResult(
             energy_metrics=EnergyMetrics(
                 total_consumption=float(self.getConsumptionVolume()),
@@ -317,7 +326,7 @@ class ECDataset:
                 individual_grid_export=self.getGridFeedInVolumePerMember(),
                 individual_market_sell_volume=self.getSellVolumePerMember(),
                 individual_charging_volume=self.getChargeVolumePerMember(),
-                has_pv=[x > 0 for x in self.production.sum()],
+                has_pv=[x > 0 for x in self._production_per_member],
             ),
             cost_metrics=CostMetrics(
                 cost_with_lec=float(sum(self.computePricePerMember(True)) * numDaysInSim / numDaysComputed / (100.0 * self.numParticipants * APT_BLOCK_SIZE)),
@@ -333,33 +342,32 @@ class ECDataset:
         )
 
 
+    def _compute_volumes(self: Self) -> None:
+        """
+        Reduces each of the core DataFrames to its overall volume in one place, such that the
+        volume getters don't reduce the DataFrames again on every call.
+        """
+        supply_per_member: npt.NDArray[np.float64] = self._supply_np.sum(axis=0)
+        self._production_per_member = self.production.to_numpy(dtype=np.float64).sum(axis=0)
+        self._consumption_per_member = self.consumption.to_numpy(dtype=np.float64).sum(axis=0)
+
+        self._production_volume = self._production_per_member.sum()
+        self._consumption_volume = self._consumption_per_member.sum()
+        self._supply_volume = supply_per_member.sum()
+        self._demand_volume = self._demand_np.sum()
+        # whatever is produced but not offered as supply (after charging) is consumed by the member itself
+        self._self_consumption_per_member = self._production_per_member - supply_per_member
+
     def computePricePerMember(self: Self, with_lec: bool) -> npt.NDArray[np.float64]:
-        costPerMember: npt.NDArray[np.float64] = np.zeros(
-            self.numParticipants, dtype=np.float64
+        # without the market, all demand is bought from and all supply is sold to the grid
+        costPerTimestep: npt.NDArray[np.float64] = (
+            self._demand_np * GRID_BUY_PRICE - self._supply_np * GRID_SELL_PRICE
         )
-        for i in range(self.numParticipants):
-            for t in range(self.numTimesteps):
-                amountRequired: float = self.demand.iloc[t, i]
-                amountFromMarket: float = (
-                    self.marketSolutions[t].getQtyPurchasedForMember(i)
-                    if with_lec
-                    else 0
-                )
-                costTrading: float = amountFromMarket * P2P_PRICE
-                amountFromGrid: float = amountRequired - amountFromMarket
-                costGrid: float = amountFromGrid * GRID_BUY_PRICE
-
-                amountSelling: float = self.supply.iloc[t, i]
-                amountToMarket: float = (
-                    self.marketSolutions[t].getQtySoldForMember(i) if with_lec else 0
-                )
-                profitTrading: float = amountToMarket * P2P_PRICE
-                amountToGrid: float = amountSelling - amountToMarket
-                profitGrid: float = amountToGrid * GRID_SELL_PRICE
-
-                costPerMember[i] += costGrid + costTrading - profitGrid - profitTrading
-
-        return costPerMember
+        if with_lec:
+            # amounts traded on the market are settled at the P2P price instead of the grid prices
+            costPerTimestep += self._purchased * (P2P_PRICE - GRID_BUY_PRICE) - self._sold * (P2P_PRICE - GRID_SELL_PRICE)
+
+        return costPerTimestep.sum(axis=0)
 
     def getDischargeVolumePerMember(self: Self) -> Optional[np.ndarray]:
         return self._discharge_volume_per_member
@@ -401,40 +409,40 @@ class ECDataset:
         """
         Returns the per-member energy fed into the grid over the timeframe of the dataset.
         """
-        return np.maximum(0, self.production.sum() - self.getSelfConsumptionVolumePerMember() - self.getSellVolumePerMember() - self.getChargeVolumePerMember())
+        return np.maximum(0, self._production_per_member - self.getSelfConsumptionVolumePerMember() - self.getSellVolumePerMember() - self.getChargeVolumePerMember())
 
     def getGridPurchaseVolumePerMember(self: Self) -> np.ndarray:
         """
         Returns the per-member energy purchased from the grid over the timeframe of the dataset.
         """
-        return np.maximum(0, self.consumption.sum() - self.getSelfConsumptionVolumePerMember() - self.getBuyVolumePerMember() - self.getDischargeVolumePerMember())
+        return np.maximum(0, self._consumption_per_member - self.getSelfConsumptionVolumePerMember() - self.getBuyVolumePerMember() - self.getDischargeVolumePerMember())
 
     def compareProductionWithConsumption(self: Self) -> tuple[int, int]:
-        return (self.supply > 0).sum().sum(), (self.demand > 0).sum().sum()
+        return int(np.count_nonzero(self._supply_np > 0)), int(np.count_nonzero(self._demand_np > 0))
 
     def getSelfConsumptionVolume(self: Self) -> float:
         """
         Returns the volume of self-consumed energy over the timeframe of the dataset.
         """
-        return self.production.sum().sum() - self.supply.sum().sum()
+        return self._production_volume - self._supply_volume
 
-    def getSelfConsumptionVolumePerMember(self: Self) -> float:
+    def getSelfConsumptionVolumePerMember(self: Self) -> np.ndarray:
         """
         Returns the volume of self-consumed energy per member over the timeframe of the dataset.
         """
-        return self.production.sum() - self.supply.sum()
+        return self._self_consumption_per_member
 
     def getTradingVolume(self: Self) -> float:
         """
         Returns the overall trading volume over the timeframe of the dataset.
         """
-        return sum(sol.tradingVolume for sol in self.marketSolutions)
+        return float(self._trading_volumes.sum())
 
     def getDemandVolume(self: Self) -> float:
         """
         Returns the overall demand on the market over the timeframe of the dataset.
         """
-        return self.demand.sum().sum()
+        return self._demand_volume
 
     def getSupplyVolumeImprecise(self: Self) -> float:
         """
@@ -442,25 +450,25 @@ class ECDataset:
         due to floating point imprecision, but is a better measure to determine the ratio
         of sold supply on the market (since the supply sold on market uses this number).
         """
-        return sum(sol.supplyVolume for sol in self.marketSolutions)
+        return float(self._supply_volumes.sum())
 
     def getSupplyVolume(self: Self) -> float:
         """
         Returns the overall supply on the market over the timeframe of the dataset.
         """
-        return self.supply.sum().sum()
+        return self._supply_volume
 
     def getConsumptionVolume(self: Self) -> float:
         """
         Returns the overall consumption of all participants over the timeframe of the dataset.
         """
-        return self.consumption.sum().sum()
+        return self._consumption_volume
 
     def getProductionVolume(self: Self) -> float:
         """
         Returns the overall production of all participants over the timeframe of the dataset.
         """
-        return self.production.sum().sum()
+        return self._production_volume
 
     def getDemandPerMember(self: Self) -> pd.Series:
         """
@@ -478,20 +486,10 @@ class ECDataset:
         """
         Returns a map from participant to its overall sell volume.
         """
-        return pd.Series(
-            {
-                i: sum(sol.getQtySoldForMember(i) for sol in self.marketSolutions)
-                for i in range(self.numParticipants)
-            }
-        )
+        return pd.Series(self._sold.sum(axis=0))
 
     def getBuyVolumePerMember(self: Self) -> pd.Series:
         """
         Returns a map from participant to its overall buy volume.
         """
-        return pd.Series(
-            {
-                i: sum(sol.getQtyPurchasedForMember(i) for sol in self.marketSolutions)
-                for i in range(self.numParticipants)
-            }
-        )
+        return pd.Series(self._purchased.sum(axis=0))
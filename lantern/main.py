@@ -10,23 +10,31 @@ user-specified parameters, and finally calls the simulation.
 
 import os
 import random
+from functools import lru_cache
 
 from .constants import APT_BLOCK_SIZE, PKL_DIR, PKL_LOAD_FILE, PKL_PV_FILE, RANDOM_SEED
 from .ec_dataset import ECDataset
 from .models import SimulationResult
 from enum import Enum
-from typing import Callable
+import numpy as np
 import pandas as pd
 import pickle
 import click
 
 
+@lru_cache(maxsize=None)
 def fetch_pkl(filename: str) -> pd.DataFrame:
-    is_cached: bool = os.path.exists(os.path.join(PKL_DIR, PKL_LOAD_FILE))
-    if not is_cached:
+    """
+    Loads a pickled input DataFrame. The input files do not change while the app runs, so
+    the result is cached for the lifetime of the process. Callers must therefore not modify
+    the returned DataFrame in place.
+    """
+    try:
+        f = open(filename, "rb")
+    except FileNotFoundError as e:
         raise FileNotFoundError(
-            f"Input DataFrame '{filename}' not found in directory '{PKL_DIR}'.")
-    with open(filename, "rb") as f:
+            f"Input DataFrame '{filename}' not found in directory '{PKL_DIR}'.") from e
+    with f:
         return pickle.load(f)
 
 
@@ -46,9 +54,44 @@ SEASON_MONTHS: dict[Season, set[int]] = {
     Season.FALL: {9, 10, 11},  # September - November
 }
 
-in_season: Callable[[Season, pd.Timestamp], bool] = (
-    lambda season, timestamp: timestamp.month in SEASON_MONTHS[season]
-)
+
+def seasonal_order(timestamps: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Returns the positions that sort the timestamps by (month, day, hour), where december
+    is treated as month 0 to create continuity for winter. Works on the integer fields of
+    the whole index at once instead of on individual Timestamp objects.
+    """
+    key: np.ndarray = (
+        ((timestamps.month.to_numpy() % 12) * 32 + timestamps.day.to_numpy()) * 24
+        + timestamps.hour.to_numpy()
+    )
+    return np.argsort(key, kind="stable")
+
+
+def season_columns(timestamps: pd.DatetimeIndex, season: Season) -> pd.DatetimeIndex:
+    """
+    Returns the timestamps within the given season, in the order given by `seasonal_order`.
+    """
+    ordered: pd.DatetimeIndex = timestamps[seasonal_order(timestamps)]
+    return ordered[ordered.month.isin(list(SEASON_MONTHS[season]))]
+
+
+@lru_cache(maxsize=len(Season))
+def season_positions(season: Season) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the column positions of the load and pv DataFrames for the timestamps in the
+    given season which exist in both, in the order given by `seasonal_order`. The input
+    DataFrames are fixed for the lifetime of the process, so the result is cached per season.
+    """
+    pv_data: pd.DataFrame = fetch_pkl(os.path.join(PKL_DIR, PKL_PV_FILE))
+    load_data: pd.DataFrame = fetch_pkl(os.path.join(PKL_DIR, PKL_LOAD_FILE))
+
+    # treat december as month 0 to create continuity for winter, and only keep
+    # datapoints in specified season which exist in both dataframes
+    common_cols: pd.Index = season_columns(load_data.columns, season).intersection(
+        season_columns(pv_data.columns, season), sort=False
+    )
+    return load_data.columns.get_indexer(common_cols), pv_data.columns.get_indexer(common_cols)
 
 
 def run_simulation(
@@ -93,28 +136,19 @@ def run_simulation(
     if not (0 <= sd_percentage <= 100):
         raise ValueError("Smart Device percentage must be between 0 and 100")
 
-    # treat december as month 0 to create continuity for winter
-    pv_data = pd.DataFrame(
-        pv_data[sorted(pv_data.columns, key=lambda x: (x.month % 12, x.day, x.hour))])
-    load_data = pd.DataFrame(load_data[sorted(
-        load_data.columns, key=lambda x: (x.month % 12, x.day, x.hour))])
+    load_cols, pv_cols = season_positions(season_enum)
 
     # only keep community_size rows
     num_rows: int = pv_data.shape[0]
     sampled_rows_load: list[int] = random.sample(
         range(num_rows * APT_BLOCK_SIZE), community_size * APT_BLOCK_SIZE)
     sampled_rows_pv: list[int] = random.sample(range(num_rows), community_size)
-    load_data = load_data.iloc[sampled_rows_load]
-    pv_data = pv_data.iloc[sampled_rows_pv]
-
-    # only keep datapoints in specified season
-    pv_data = pv_data.loc[:, [
-        in_season(season_enum, col) for col in pv_data.columns]]
-    load_data = load_data.loc[
-        :, [in_season(season_enum, col) for col in load_data.columns]
-    ]
-    pv_data = pv_data.reset_index(drop=True)
-    load_data = load_data.reset_index(drop=True)
+
+    # select the sampled rows and the common season columns in a single copy
+    load_data = load_data.iloc[sampled_rows_load, load_cols]
+    pv_data = pv_data.iloc[sampled_rows_pv, pv_cols]
+    load_data.index = pd.RangeIndex(len(load_data))
+    pv_data.index = pd.RangeIndex(len(pv_data))
 
     # set pv datapoints to zero for members without pv
     num_members_without_pv: int = community_size - int(
@@ -125,10 +159,6 @@ def run_simulation(
     )
     pv_data.loc[members_without_pv, :] = 0
 
-    common_cols = load_data.columns.intersection(pv_data.columns)
-    pv_data = pd.DataFrame(pv_data[common_cols])
-    load_data = pd.DataFrame(load_data[common_cols])
-
     return ECDataset(pv_data.T, load_data.T, 1, sd_percentage, with_battery).simulate()
 
 
@@ -10,42 +10,51 @@ It constructs a graph, given the load and PV amount of all members for a
 timestep, and computes an optimal market allocation (who sells how much to whom).
 
 It provides the methods `getQtySoldForMember` and `getQtyPurchasedForMember` to access
-the result of the allocation, as well as `plotFlowGraph` to visualize the per-timestep
-network.
+the result of the allocation (or `soldPerMember` and `purchasedPerMember` for all members
+at once), as well as `plotFlowGraph` to visualize the per-timestep network.
 
 The network that we're interested in in the end is however an overlay of ALL timesteps.
 It is accumulated in the static field `overall_trading_network`.
 """
 
 from .constants import SOURCE, NetworkAlloc, TARGET, UNBOUNDED
-import pandas as pd
 import networkx as nx
+import numpy as np
+import numpy.typing as npt
 from typing import List, Self
-import matplotlib.pyplot as plt
 
 
 class MarketSolution:
     # Static field documenting the accumulated trading network over all timesteps
     overall_trading_network: NetworkAlloc = {}
 
-    def __init__(self: Self, supply: pd.Series, demand: pd.Series) -> None:
+    def __init__(self: Self, supply: npt.NDArray[np.float64], demand: npt.NDArray[np.float64]) -> None:
         self.tradingVolume: float
         self.supplyVolume: float = sum(sorted(supply))
         self.sellMap: NetworkAlloc
         self.N_fair: nx.DiGraph
+        self.soldPerMember: npt.NDArray[np.float64]
+        self.purchasedPerMember: npt.NDArray[np.float64]
 
-        self.N_fair = self._construct_fair_network(supply, demand)
+        nodes: List[str] = [self._get_node(i) for i in range(len(supply))]
+        self.N_fair = self._construct_fair_network(supply, demand, nodes)
         self.tradingVolume, self.sellMap = nx.maximum_flow(self.N_fair, SOURCE, TARGET)
         self.tradingVolume = min(self.tradingVolume, self.supplyVolume)
         self._add_flow_to_total_network(self.sellMap)
 
+        # read the allocation of every member out of the flow once
+        self.soldPerMember = np.array(
+            [self.sellMap[SOURCE].get(node, 0) for node in nodes], dtype=np.float64
+        )
+        self.purchasedPerMember = np.array(
+            [self.sellMap[node].get(TARGET, 0) for node in nodes], dtype=np.float64
+        )
+
     def getQtySoldForMember(self: Self, member: int) -> float:
-        node: str = self._get_node(member)
-        return self.sellMap[SOURCE].get(node, 0)
+        return float(self.soldPerMember[member])
 
     def getQtyPurchasedForMember(self: Self, member: int) -> float:
-        node: str = self._get_node(member)
-        return self.sellMap[node].get(TARGET, 0)
+        return float(self.purchasedPerMember[member])
 
     def plot_flow_graph(self: Self) -> None:
         """
@@ -57,6 +66,9 @@ class MarketSolution:
         Returns:
         None
         """
+        # matplotlib is only needed for debugging plots, keep it out of the app's startup
+        import matplotlib.pyplot as plt
+
         flow_graph: nx.DiGraph = nx.DiGraph()
 
         # Add edges with flow > 0 to the flow graph
@@ -117,16 +129,19 @@ class MarketSolution:
                         MarketSolution.overall_trading_network[u][v] += flow
 
     def _construct_fair_network(
-        self: Self, supply: pd.Series, demand: pd.Series
+        self: Self,
+        supply: npt.NDArray[np.float64],
+        demand: npt.NDArray[np.float64],
+        nodes: List[str],
     ) -> nx.DiGraph:
         """
         Constructs a directed graph (`nx.DiGraph`) to run a maximum flow algorithm from SOURCE to TARGET.
 
         The network is built based on the following rules:
-        - A non-negative value `v` in `vals` is modeled as a "producer" vertex with
-        an edge from SOURCE to the producer node (itself) with capacity `v`.
-        - A negative value `v` in `vals` is modeled as a "consumer" vertex with
-        an edge from the consumer node (itself) to TARGET with capacity `-v`.
+        - A member with positive supply `s` is modeled as a "producer" vertex with
+        an edge from SOURCE to the producer node (itself) with capacity `s`.
+        - Any other member with positive demand `d` is modeled as a "consumer" vertex with
+        an edge from the consumer node (itself) to TARGET with capacity `d`.
         - An edge with unbounded capacity is added from every producer vertex to every consumer vertex.
         - If the sum of producing capacities 'p' is larger than the sum of consuming capacities 'c',
         the edge capacities from SOURCE to producers are multiplied with 'p'/'c' and if 'c' > 'p'
@@ -134,18 +149,20 @@ class MarketSolution:
         This modification ensures fairness of the resulting flow.
 
         Parameters:
-        vals (pd.Series): A pandas Series containing float values where each index represents a node.
+        supply (np.ndarray): The supply of every member in this timestep.
+        demand (np.ndarray): The demand of every member in this timestep.
+        nodes (List[str]): The node name of every member, as given by `_get_node`.
 
         Returns:
-        nx.DiGraph: A directed graph where the nodes and edges are constructed based on `vals`,
-                    ready to run a max-flow algorithm from SOURCE to TARGET.
+        nx.DiGraph: A directed graph where the nodes and edges are constructed based on `supply`
+                    and `demand`, ready to run a max-flow algorithm from SOURCE to TARGET.
 
         Example:
-        >>> vals = pd.Series([10, -5, 15, -8])
-        >>> network = construct_fair_network(vals)
+        >>> supply, demand = np.array([10.0, 0.0, 15.0, 0.0]), np.array([0.0, 5.0, 0.0, 8.0])
+        >>> network = self._construct_fair_network(supply, demand, ["0", "1", "2", "3"])
         >>> tradingVolume, flow_dict = nx.maximum_flow(network, SOURCE, TARGET)
         """
-        total_supply: float = sum(sorted(supply))
+        total_supply: float = self.supplyVolume
         total_demand: float = sum(sorted(demand))
 
         # scale supply/demand s.t. both market sides have equal quantity
@@ -156,26 +173,22 @@ class MarketSolution:
         elif total_demand != 0:
             demand_ratio = total_supply / total_demand
 
+        producing: npt.NDArray[np.bool_] = supply > 0
+        producers: npt.NDArray[np.intp] = np.flatnonzero(producing)
+        consumers: npt.NDArray[np.intp] = np.flatnonzero(~producing & (demand > 0))
+
         network: nx.DiGraph = nx.DiGraph()
         network.add_node(SOURCE)
         network.add_node(TARGET)
-        producers: List[int] = []
-        consumers: List[int] = []
-        for i, (dem, sup) in enumerate(zip(demand, supply)):
-            node = self._get_node(i)
-            network.add_node(node)
-            if sup > 0:
-                producers.append(i)
-                network.add_edge(SOURCE, node, capacity=sup * supply_ratio)
-            elif dem > 0:
-                consumers.append(i)
-                network.add_edge(node, TARGET, capacity=dem * demand_ratio)
+        network.add_nodes_from(nodes)
+        network.add_edges_from(
+            (SOURCE, nodes[i], {"capacity": supply[i] * supply_ratio}) for i in producers
+        )
+        network.add_edges_from(
+            (nodes[i], TARGET, {"capacity": demand[i] * demand_ratio}) for i in consumers
+        )
         network.add_edges_from(
-            (
-                self._get_node(supplier),
-                self._get_node(consumer),
-                {"capacity": UNBOUNDED},
-            )
+            (nodes[supplier], nodes[consumer], {"capacity": UNBOUNDED})
             for supplier in producers
             for consumer in consumers
         )
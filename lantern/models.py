@@ -87,22 +87,12 @@ class TradingNetwork(BaseModel):
         Creates the frontend-compatible structure from a NetworkX graph.
         Extracts node IDs and edge source/target/weight.
         """
-        nodes_list = []
-        for node_id, node_data in G.nodes(data=True):
-            node_attrs = {"id": node_id}
-            nodes_list.append(NodeObject(**node_attrs))
-
-        edges_list = []
-        for u, v, edge_data in G.edges(data=True):
-            edge_attrs = {
-                "source": u,
-                "target": v,
-                "value": float(edge_data.get('weight', 1.0)) # Use 'value', get 'weight' from data
-            }
-            # Example: Add 'type' if it exists in edge_data and EdgeObject has 'type'
-            # if 'type' in edge_data:
-            #     edge_attrs['type'] = edge_data['type']
-            edges_list.append(EdgeObject(**edge_attrs)) # Create EdgeObject instance
+        # construct the objects directly, without intermediate attribute dicts
+        nodes_list = [NodeObject(id=node_id) for node_id in G.nodes]
+        edges_list = [
+            EdgeObject(source=u, target=v, value=float(weight)) # Use 'value', get 'weight' from data
+            for u, v, weight in G.edges(data='weight', default=1.0)
+        ]
 
         return cls(nodes=nodes_list, edges=edges_list)
 
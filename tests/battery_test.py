@@ -0,0 +1,60 @@
+from lantern.battery import Battery, BatteryBank
+from lantern.constants import CONVERSION_LOSS, DISCHARGE_THRESHOLD, RETENTION_RATE
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+
+amounts = st.lists(
+    st.floats(min_value=0, max_value=20, allow_nan=False), min_size=1, max_size=50
+)
+
+
+@settings(deadline=None)  # the first call may jit-compile the schedule kernel
+@given(supply=amounts, demand=amounts)
+def test_schedule_matches_stepwise(supply, demand):
+    """Running a whole schedule at once must match calling charge/discharge per timestep."""
+    n = min(len(supply), len(demand))
+    supply_arr = np.array(supply[:n])
+    demand_arr = np.array(demand[:n])
+
+    stepwise = Battery(10, 1)
+    expected_charged = np.zeros(n)
+    expected_discharged = np.zeros(n)
+    for t in range(n):
+        if supply_arr[t] > 0:
+            expected_charged[t] = stepwise.charge(float(supply_arr[t]))
+        elif demand_arr[t] > 0:
+            expected_discharged[t] = stepwise.discharge(float(demand_arr[t]))
+
+    batch = Battery(10, 1)
+    charged, discharged = batch.simulate_schedule(supply_arr, demand_arr)
+
+    np.testing.assert_allclose(charged, expected_charged)
+    np.testing.assert_allclose(discharged, expected_discharged)
+    assert batch._current_cap == stepwise._current_cap
+
+
+def test_charge_applies_conversion_loss():
+    """Charging 100 kWh stores 100 * (1 - CONVERSION_LOSS) kWh, before retention is applied."""
+    battery = Battery(1000, 1)
+    assert battery.charge(100) == 100
+    expected = (DISCHARGE_THRESHOLD * 1000 + 100 * (1 - CONVERSION_LOSS)) * RETENTION_RATE
+    assert battery._current_cap == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bank_matches_individual_batteries(seed):
+    """A BatteryBank must behave like one independent Battery per column."""
+    rng = np.random.default_rng(seed)
+    # sparse surplus, such that some timesteps have neither supply nor demand
+    supply = rng.random((100, 8)) * 8 * (rng.random((100, 8)) > 0.5)
+    demand = rng.random((100, 8)) * 8 * (rng.random((100, 8)) > 0.3)
+
+    charged, discharged = BatteryBank(8, 10, 1).simulate_schedule(supply, demand)
+
+    for i in range(8):
+        expected_charged, expected_discharged = Battery(10, 1).simulate_schedule(
+            supply[:, i], demand[:, i]
+        )
+        np.testing.assert_allclose(charged[:, i], expected_charged)
+        np.testing.assert_allclose(discharged[:, i], expected_discharged)
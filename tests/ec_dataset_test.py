@@ -0,0 +1,82 @@
+from lantern import ec_dataset
+from lantern.main import run_simulation
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import find_peaks
+
+
+def reference_adjust_for_smart_devices(smart_device_percentage, load, pv):
+    """The original per-day, per-user pandas implementation of `adjust_for_smart_devices`."""
+    load_shifted = load.copy()
+    users = load_shifted.columns
+    shiftable_users = np.random.choice(
+        users, size=int(len(users) * smart_device_percentage / 100), replace=False
+    )
+    shift_daily = 0.64
+    shift_3day = 0.5
+
+    load_shifted["date"] = load_shifted.index.date
+    pv_copy = pv.copy()
+    pv_copy["date"] = pv_copy.index.date
+    grouped_generation = pv_copy.groupby("date")
+
+    for day, data in load_shifted.groupby("date"):
+        total_demand = data.drop(columns=["date"]).sum(axis=1)
+        valid_hours = total_demand.between_time("08:00", "22:00")
+        peak_indices, _ = find_peaks(valid_hours, prominence=0.2, distance=3)
+        peak_hours = (
+            valid_hours.iloc[peak_indices].nlargest(3).index
+            if len(peak_indices) > 0
+            else valid_hours.nlargest(3).index
+        )
+        valley_hours = valid_hours.nsmallest(3).index
+        pv_generation = grouped_generation.get_group(day).drop(columns=["date"]).sum(axis=1)
+        high_pv_hours = pv_generation.nlargest(3).index
+
+        shifts = [(peak_hours[0] if len(peak_hours) > 0 else None, shift_daily)]
+        if day.day % 3 == 0 and len(peak_hours) > 0:
+            shifts.append((peak_hours[1] if len(peak_hours) > 1 else peak_hours[0], shift_3day))
+        for peak_hour, amount in shifts:
+            if peak_hour is None:
+                continue
+            for user in shiftable_users:
+                if load_shifted.loc[peak_hour, user] >= amount:
+                    shift_target = (
+                        np.random.choice(high_pv_hours)
+                        if not high_pv_hours.empty
+                        else np.random.choice(valley_hours)
+                    )
+                    load_shifted.loc[peak_hour, user] -= amount
+                    load_shifted.loc[shift_target, user] += amount
+
+    return load_shifted.drop(columns="date")
+
+
+@pytest.mark.filterwarnings("ignore::FutureWarning", "ignore::RuntimeWarning")
+@pytest.mark.parametrize(
+    "community_size, season, pv, sd",
+    [(10, "spr", 0, 100), (10, "spr", 60, 100), (20, "aut", 50, 50), (10, "win", 100, 100)],
+)
+def test_smart_devices_match_reference(monkeypatch, community_size, season, pv, sd):
+    """The vectorized load shifting must reproduce the original implementation exactly."""
+    calls = []
+    adjust = ec_dataset.adjust_for_smart_devices
+
+    def recording_adjust(smart_device_percentage, load, pv_data):
+        calls.append((np.random.get_state(), smart_device_percentage, load.copy(), pv_data.copy()))
+        return adjust(smart_device_percentage, load, pv_data)
+
+    monkeypatch.setattr(ec_dataset, "adjust_for_smart_devices", recording_adjust)
+    run_simulation(community_size, season, pv, sd, False)
+    state, percentage, load, pv_data = calls[0]
+
+    np.random.set_state(state)
+    expected = reference_adjust_for_smart_devices(percentage, load, pv_data)
+    np.random.set_state(state)
+    shifted = adjust(percentage, load, pv_data)
+
+    pd.testing.assert_index_equal(shifted.index, expected.index)
+    np.testing.assert_array_equal(
+        shifted.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64)
+    )